@@ -1,12 +1,33 @@
+import os
+from datetime import date
+from typing import List, Tuple
+
 import dash
 from dash import dcc, html, Input, Output
 import plotly.express as px
+import plotly.graph_objects as go
 import duckdb
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask_caching import Cache
 
 # initialize the Dash app
 app = dash.Dash(__name__)
 
+# cache query results on disk so every server worker process shares them
+cache = Cache(app.server, config={
+    "CACHE_TYPE": "FileSystemCache",
+    "CACHE_DIR": "../cache/dashboard",
+    "CACHE_DEFAULT_TIMEOUT": 300
+})
+
+# map data exported by the transformation pipeline
+MAP_CACHE_PATH = "../cache/map.parquet"
+
+# upper bound on the number of points drawn in the time-series line plot
+LINE_PLOT_MAX_POINTS = 1000
+
 # define the overall layout of the app: 
 # two tabs with different controls and graphs
 app.layout = html.Div([
@@ -46,6 +67,240 @@ app.layout = html.Div([
     ])
 ])
 
+
+def _connect_to_database() -> duckdb.DuckDBPyConnection:
+    """
+    Open a short-lived read-only connection to the database. Connections are
+    not held between queries so the pipeline can write to the database while
+    the app is running. Threads and memory are kept small so the queries do
+    not compete with the web server.
+    """
+
+    return duckdb.connect(
+        "../air_quality.db",
+        read_only=True,
+        config={"threads": 2, "memory_limit": "1GB"}
+    )
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert an Arrow result to pandas, keeping string columns Arrow-backed
+    instead of copying them into Python objects.
+    """
+
+    string_dtype = pd.ArrowDtype(pa.string())
+    return table.to_pandas(
+        types_mapper={pa.string(): string_dtype,
+                      pa.large_string(): string_dtype}.get,
+        date_as_object=False
+    )
+
+
+# the presentation tables only change when the pipeline runs again, so query
+# results are memoized in the shared cache for a few minutes
+
+
+@cache.memoize()
+def _latest_values() -> pd.DataFrame:
+    """
+    Fetch the latest parameter values for every sensor location, with
+    missing values as zero, preferring the Parquet export written by the
+    transformation pipeline.
+    """
+
+    if os.path.exists(MAP_CACHE_PATH):
+        return _to_pandas(pq.read_table(MAP_CACHE_PATH))
+
+    with _connect_to_database() as db_connection:
+        arrow_table = db_connection.execute(
+            """
+            SELECT
+                location,
+                lat,
+                lon,
+                datetime,
+                COALESCE(pm10, 0) AS pm10,
+                COALESCE(pm25, 0) AS pm25,
+                COALESCE(so2, 0) AS so2
+            FROM presentation.latest_param_values_per_location
+            """
+        ).fetch_arrow_table()
+
+    return _to_pandas(arrow_table)
+
+
+@cache.memoize()
+def _dropdown_choices() -> Tuple[List[str], List[str], date, date]:
+    """
+    Fetch the distinct locations and parameters of the daily stats table
+    along with the first and last measurement dates.
+    """
+
+    with _connect_to_database() as db_connection:
+        locations = [
+            location for (location,) in db_connection.execute(
+                """
+                SELECT DISTINCT location
+                FROM presentation.daily_air_quality_stats
+                ORDER BY location
+                """
+            ).fetchall()
+        ]
+        parameters = [
+            parameter for (parameter,) in db_connection.execute(
+                """
+                SELECT DISTINCT parameter
+                FROM presentation.daily_air_quality_stats
+                ORDER BY parameter
+                """
+            ).fetchall()
+        ]
+        start_date, end_date = db_connection.execute(
+            """
+            SELECT min(measurement_date), max(measurement_date)
+            FROM presentation.daily_air_quality_stats
+            """
+        ).fetchone()
+
+    return locations, parameters, start_date, end_date
+
+
+@cache.memoize()
+def _weekday_box_stats(
+    location: str, parameter: str, start_date: date, end_date: date
+) -> pd.DataFrame:
+    """
+    Compute the box plot statistics of the daily averages per weekday for
+    one location and parameter within a date range, ordered by weekday
+    number. The whiskers follow Plotly's default of the furthest values
+    within 1.5 IQR of the quartiles.
+    """
+
+    with _connect_to_database() as db_connection:
+        arrow_table = db_connection.execute(
+            """
+            WITH daily AS (
+                SELECT weekday, weekday_number, average_value
+                FROM presentation.daily_air_quality_stats
+                WHERE location = $location
+                AND parameter = $parameter
+                AND measurement_date BETWEEN $start_date AND $end_date
+            ),
+            quartiles AS (
+                SELECT
+                    weekday_number,
+                    quantile_cont(average_value, 0.25) AS q1,
+                    quantile_cont(average_value, 0.5) AS median,
+                    quantile_cont(average_value, 0.75) AS q3
+                FROM daily
+                GROUP BY weekday_number
+            )
+            SELECT
+                daily.weekday,
+                daily.weekday_number,
+                quartiles.q1,
+                quartiles.median,
+                quartiles.q3,
+                min(daily.average_value) FILTER (
+                    WHERE daily.average_value
+                        >= quartiles.q1 - 1.5 * (quartiles.q3 - quartiles.q1)
+                ) AS lower,
+                max(daily.average_value) FILTER (
+                    WHERE daily.average_value
+                        <= quartiles.q3 + 1.5 * (quartiles.q3 - quartiles.q1)
+                ) AS upper
+            FROM daily
+            JOIN quartiles USING (weekday_number)
+            GROUP BY ALL
+            ORDER BY daily.weekday_number
+            """,
+            {
+                "location": location,
+                "parameter": parameter,
+                "start_date": start_date,
+                "end_date": end_date
+            }
+        ).fetch_arrow_table()
+
+    return _to_pandas(arrow_table)
+
+
+@cache.memoize()
+def _line_series(
+    location: str, parameter: str, start_date: date, end_date: date
+) -> pd.DataFrame:
+    """
+    Fetch the daily averages for one location and parameter within a date
+    range, ordered by date. Series longer than LINE_PLOT_MAX_POINTS are
+    downsampled with M4: the date range is split into equal-width bins and
+    only the first, last, minimum and maximum point of each bin is kept,
+    which preserves the shape of the drawn line.
+    """
+
+    with _connect_to_database() as db_connection:
+        arrow_table = db_connection.execute(
+            """
+            WITH series AS (
+                SELECT
+                    measurement_date,
+                    average_value,
+                    units,
+                    epoch(measurement_date) AS t
+                FROM presentation.daily_air_quality_stats
+                WHERE location = $location
+                AND parameter = $parameter
+                AND measurement_date BETWEEN $start_date AND $end_date
+            ),
+            binned AS (
+                SELECT
+                    *,
+                    count(*) OVER () AS n,
+                    floor(
+                        $bins * (t - min(t) OVER ())
+                        / (max(t) OVER () - min(t) OVER () + 1)
+                    ) AS bin
+                FROM series
+            ),
+            ranked AS (
+                SELECT
+                    *,
+                    row_number() OVER (PARTITION BY bin ORDER BY t) AS first_rank,
+                    row_number() OVER (PARTITION BY bin ORDER BY t DESC) AS last_rank,
+                    row_number() OVER (PARTITION BY bin ORDER BY average_value) AS min_rank,
+                    row_number() OVER (PARTITION BY bin ORDER BY average_value DESC) AS max_rank
+                FROM binned
+            )
+            SELECT measurement_date, average_value, units
+            FROM ranked
+            WHERE n <= $max_points
+            OR 1 IN (first_rank, last_rank, min_rank, max_rank)
+            ORDER BY measurement_date
+            """,
+            {
+                "location": location,
+                "parameter": parameter,
+                "start_date": start_date,
+                "end_date": end_date,
+                "bins": LINE_PLOT_MAX_POINTS // 4,
+                "max_points": LINE_PLOT_MAX_POINTS
+            }
+        ).fetch_arrow_table()
+
+    return _to_pandas(arrow_table)
+
+
+@app.server.route("/refresh")
+def refresh():
+    """
+    Drop the memoized query results so the next callbacks re-read the
+    database, e.g. after the pipeline has loaded new data.
+    """
+
+    cache.clear()
+    return "Cache cleared"
+
+
 @app.callback(
     Output("map-view", "figure"),
     Input("map-view", "id")
@@ -56,14 +311,8 @@ def update_map(_):
     Triggered once on load (input is the map component's ID).
     """
 
-    # connect to DuckDB in read-only mode
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        latest_values_df = db_connection.execute(
-            "SELECT * FROM presentation.latest_param_values_per_location"
-        ).fetchdf()
-
-    # replace any missing values with zero for plotting
-    latest_values_df.fillna(0, inplace=True)
+    # missing values are already replaced with zero for plotting
+    latest_values_df = _latest_values()
 
     # create a Mapbox scatter plot of sensor locations
     map_fig = px.scatter_mapbox(
@@ -109,31 +358,24 @@ def update_dropdowns(_):
     Triggered on app load (input is dropdown ID, not its value).
     """
 
-    # query the daily stats table for all entries
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        df = db_connection.execute(
-            "SELECT * FROM presentation.daily_air_quality_stats"
-        ).fetchdf()
+    # get the distinct choices and date range of the daily stats table
+    locations, parameters, start_date, end_date = _dropdown_choices()
 
-     # build list of dicts for the location and parameter dropdown
+    # build list of dicts for the location and parameter dropdown
     location_options = [
-        {"label": location, "value": location} 
-        for location in df["location"].unique()
+        {"label": location, "value": location}
+        for location in locations
     ]
     parameter_options = [
         {"label": parameter, "value": parameter}
-        for parameter in df["parameter"].unique()
+        for parameter in parameters
     ]
 
-    # determine the available date range from the data
-    start_date = df["measurement_date"].min()
-    end_date = df["measurement_date"].max()
-
     return (
         location_options,
-        df["location"].unique()[0],
+        locations[0],
         parameter_options,
-        df["parameter"].unique()[0],
+        parameters[0],
         start_date,
         end_date,
     )
@@ -154,50 +396,66 @@ def update_plots(selected_location, selected_parameter, start_date, end_date):
     based on user-selected location, parameter, and date range.
     """
 
-    # read the full daily stats table
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        daily_stats_df = db_connection.execute(
-            "SELECT * FROM presentation.daily_air_quality_stats"
-        ).fetchdf()
+    # nothing to plot until every control has a value, e.g. the date picker
+    # clears the end date when a start date after it is picked
+    if not all([selected_location, selected_parameter, start_date, end_date]):
+        empty_line = px.line(title="No data available for that selection")
+        empty_box  = px.box(title="No data available for that selection")
+        return empty_line, empty_box
 
-    # filter data for the chosen location, parameter, and date range
-    filtered_df = daily_stats_df[daily_stats_df["location"] ==
-                                selected_location]
-    filtered_df = filtered_df[filtered_df["parameter"] == selected_parameter]
-    filtered_df = filtered_df[
-        (filtered_df["measurement_date"] >= pd.to_datetime(start_date))
-        & (filtered_df["measurement_date"] <= pd.to_datetime(end_date))
-    ]
+    # parse the picked dates once; they are passed to DuckDB as DATE
+    # parameters and give the cached queries a consistent key
+    start_date = pd.to_datetime(start_date).date()
+    end_date = pd.to_datetime(end_date).date()
+
+    # read only the rows for the chosen location, parameter, and date range;
+    # the line plot gets a downsampled copy of the series and the box plot
+    # one row of precomputed statistics per weekday
+    line_df = _line_series(
+        selected_location, selected_parameter, start_date, end_date
+    )
+    box_stats_df = _weekday_box_stats(
+        selected_location, selected_parameter, start_date, end_date
+    )
 
     # if no data remains, return empty placeholder figures
-    if filtered_df.empty:
+    if line_df.empty:
         empty_line = px.line(title="No data available for that selection")
         empty_box  = px.box(title="No data available for that selection")
         return empty_line, empty_box
 
     # extract the unit label for axis labeling
-    unit_label = filtered_df["units"].iat[0]  # first element
+    unit_label = line_df["units"].iat[0]  # first element
 
     labels = {
         "average_value": unit_label,
         "measurement_date": "Date"
         }
 
-    # time-series line plot, sorted by date
+    # time-series line plot, already sorted by date in the query
     line_fig = px.line(
-        filtered_df.sort_values(by="measurement_date"),
+        line_df,
         x="measurement_date",
         y="average_value",
         labels=labels,
         title=f"Plot Over Time of {selected_parameter} Levels"
     )
 
-    # box plot of values by weekday, sorted to Monday→Sunday order
-    box_fig = px.box(
-        filtered_df.sort_values(by="weekday_number"),
-        x="weekday",
-        y="average_value",
-        labels=labels,
+    # box plot of values by weekday, already sorted by weekday number in the
+    # query; the statistics are precomputed so only they are sent
+    box_fig = go.Figure(
+        go.Box(
+            x=box_stats_df["weekday"],
+            q1=box_stats_df["q1"],
+            median=box_stats_df["median"],
+            q3=box_stats_df["q3"],
+            lowerfence=box_stats_df["lower"],
+            upperfence=box_stats_df["upper"]
+        )
+    )
+    box_fig.update_layout(
+        xaxis_title="weekday",
+        yaxis_title=unit_label,
         title=f"Distribution of {selected_parameter} Levels by Weekday"
     )
 
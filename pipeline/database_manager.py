@@ -1,4 +1,5 @@
-from typing import List
+from typing import Any, Dict, List, Optional
+from pathlib import Path
 import os
 import argparse
 import logging
@@ -8,12 +9,22 @@ import duckdb as ddb
 
 # Use type hinting to guide
 
-def connect_to_database(path: str) -> DuckDBPyConnection:
+def connect_to_database(
+    path: str, cache_httpfs: bool = False, 
+    threads: Optional[int] = None, memory_limit: Optional[str] = None
+) -> DuckDBPyConnection:
     """
     Establish a connection to a DuckDB database located at the given path.
 
     Args:
         path (str): Path to the DuckDB database file.
+        cache_httpfs (bool): Whether to load the cache_httpfs community 
+            extension so remote files read again, also by later runs, 
+            are served from a local on-disk cache.
+        threads (Optional[int]): Number of threads DuckDB may use. 
+            Defaults to the number of CPUs.
+        memory_limit (Optional[str]): Maximum memory DuckDB may use, 
+            e.g. '4GB'. Defaults to DuckDB's own limit.
 
     Returns:
         DuckDBPyConnection: An active connection to the DuckDB database.
@@ -22,13 +33,29 @@ def connect_to_database(path: str) -> DuckDBPyConnection:
     # give users feedback on what they're doing
     logging.info(f"Connecting to database at {path}")
 
-    con = ddb.connect(path)
+    # size DuckDB explicitly rather than relying on per-process defaults;
+    # options that cannot be resolved are left to DuckDB
+    config = {}
+    threads = threads or os.cpu_count()
+    if threads:
+        config["threads"] = threads
+    if memory_limit is not None:
+        config["memory_limit"] = memory_limit
+
+    con = ddb.connect(path, config=config)
     # set placeholder S3 credentials in case remote files are accessed
     con.sql("""
         SET s3_access_key_id='';
         SET s3_secret_access_key='';
         SET s3_region='';
         """)
+    if cache_httpfs:
+        # keep remote file blocks on disk instead of downloading them again
+        con.sql("""
+            INSTALL cache_httpfs FROM community;
+            LOAD cache_httpfs;
+            SET cache_httpfs_type='on_disk';
+            """)
     return con
 
 
@@ -55,19 +82,12 @@ def collect_query_paths(parent_dir: str) -> List[str]:
         List[str]: A sorted list of full paths to found SQL files.
     """
     
-    sql_files = []
-
-    # walk through the directory tree rooted at parent_dir
-    for root, _, files in os.walk(parent_dir):
-        for file in files:
-            # check if the file has a .sql extension
-            if file.endswith(".sql"):
-                file_path = os.path.join(root, file)
-                sql_files.append(file_path)
-    
+    # search the directory tree rooted at parent_dir for .sql files and
+    # sort the paths alphabetically
+    sql_files = sorted(str(path) for path in Path(parent_dir).rglob("*.sql"))
+
     logging.info(f"Found {len(sql_files)} sql scripts at location {parent_dir}")
-    # return paths sorted alphabetically
-    return sorted(sql_files)
+    return sql_files
 
 
 def read_query(path: str) -> str:
@@ -82,25 +102,47 @@ def read_query(path: str) -> str:
         str: SQL query content as a string.
     """
 
-    with open(path, "r") as f:
-        query = f.read()
-        f.close()
+    # read the raw bytes and decode them once
+    with open(path, "rb") as f:
+        query = f.read().decode("utf-8")
     return query
 
 
-def execute_query(con: DuckDBPyConnection, query: str) -> None:
+def compile_query_script(query_paths: List[str]) -> str:
+    """
+    Reads several SQL files and joins their contents into a single 
+    multi-statement script, in the given order.
+
+    Args:
+        query_paths (List[str]): Full paths to the SQL files.
+
+    Returns:
+        str: SQL script with one statement per file.
+    """
+
+    # drop trailing semicolons so every statement is terminated exactly once
+    queries = [read_query(path).rstrip().rstrip(";") for path in query_paths]
+    return ";\n".join(queries) + ";"
+
+
+def execute_query(
+    con: DuckDBPyConnection, query: str, 
+    parameters: Optional[Dict[str, Any]] = None
+) -> None:
     """
     Executes a SQL query using the provided DuckDB connection.
 
     Args:
         con (DuckDBPyConnection): The database connection object.
         query (str): The SQL query to be executed.
+        parameters (Optional[Dict[str, Any]]): Values bound to the named 
+            `$parameter` placeholders of the query, if any.
 
     Returns:
         None
     """
 
-    con.execute(query)
+    con.execute(query, parameters)
 
 
 def setup_database(database_path: str, ddl_query_parent_dir: str) -> None:
@@ -121,11 +163,10 @@ def setup_database(database_path: str, ddl_query_parent_dir: str) -> None:
     query_paths = collect_query_paths(ddl_query_parent_dir)
     con = connect_to_database(database_path)
 
-    # iterate through each of the queries and excute them
-    for query_path in query_paths:
-        query = read_query(query_path)
-        execute_query(con, query)
-        logging.info(f"Executed query from {query_path}")
+    # submit all of the queries as one script
+    script = compile_query_script(query_paths)
+    execute_query(con, script)
+    logging.info(f"Executed queries from {', '.join(query_paths)}")
     
     # disconnect database
     close_database_connection(con)
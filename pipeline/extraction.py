@@ -3,13 +3,12 @@ Example usage: python extraction.py --locations-file-path ../locations.json --st
 """
 
 import argparse
-import json
 import logging
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
 
-from duckdb import IOException
+import orjson
+from duckdb import DuckDBPyConnection, IOException
 from jinja2 import Template
 
 from database_manager import (
@@ -34,90 +33,91 @@ def read_location_ids(file_path: str) -> List[str]:
         List[str]: A list of location IDs as strings.
     """
 
-    with open(file_path, "r") as f:
+    with open(file_path, "rb") as f:
         # parse JSON into a Python dict
-        locations = json.load(f)
-        f.close()
+        locations = orjson.loads(f.read())
 
-    # extract the dictionary keys (IDs)
-    location_ids = [str(id) for id in locations.keys()]
+    # extract the dictionary keys (IDs), which JSON already keeps as strings
+    location_ids = list(locations.keys())
     return location_ids
 
 
 def compile_data_file_paths(
-    data_file_path_template: str, location_ids: List[str], 
-    start_date: str, end_date: str
+    data_file_path_template: str, location_ids: List[str]
 ) -> List[str]:
     """
-    Generate a list of data file paths for each location and month in 
-    the date range.
+    Generate a data file path glob for each location.
 
     Args:
         data_file_path_template (str): Jinja2 template string for the file path.
-            It should use placeholders: {{location_id}}, {{year}}, {{month}}.
+            It should use the placeholder {{location_id}} and glob over the
+            year and month partitions.
         location_ids (List[str]): List of location IDs to substitute 
             into the template.
-        start_date (str): Inclusive start date in "YYYY-MM" format.
-        end_date (str): Inclusive end date in "YYYY-MM" format.
 
     Returns:
-        List[str]: A list of rendered file path strings for every month between
-            start_date and end_date (inclusive) for each location.
+        List[str]: A list of rendered file path strings, one per location.
     """
-    
-    # parse the input date strings into datetime objects
-    start_date = datetime.strptime(start_date, "%Y-%m")
-    end_date = datetime.strptime(end_date, "%Y-%m")
-
-    data_file_paths = []
-
-    # for each location, iterate month by month through the date range
-    for location_id in location_ids:
-        index_date = start_date
-
-        while index_date <= end_date:
-            # render the template with the current location/year/month
-            data_file_path = Template(data_file_path_template).render(
-                location_id=location_id,
-                year=str(index_date.year),
-                month=str(index_date.month).zfill(2) # ensure two-digit month
-            )
-            data_file_paths.append(data_file_path)
 
-            # move to the next month
-            index_date += relativedelta(months=1)
+    # compile the template once and render it for every location
+    template = Template(data_file_path_template)
+    data_file_paths = [
+        template.render(location_id=location_id)
+        for location_id in location_ids
+    ]
 
     return data_file_paths
 
-def compile_data_file_query(
-    base_path: str, data_file_path: str, extract_query_template: str
-) -> str:
+def compile_data_file_query_parameters(
+    base_path: str, data_file_path: str, start_date: str, end_date: str
+) -> Dict[str, str]:
     """
-    Render the SQL extraction query for a given data file path.
+    Build the values bound to the SQL extraction query for a given data 
+    file path.
 
     Args:
         base_path (str): Root path where data files are stored.
-        data_file_path (str): Relative path template for the data file.
-        extract_query_template (str): Jinja2 template of the SQL extraction 
-            query, with a placeholder {{data_file_path}}.
+        data_file_path (str): Relative path glob for the data files.
+        start_date (str): Inclusive start month in "YYYY-MM" format.
+        end_date (str): Inclusive end month in "YYYY-MM" format.
 
     Returns:
-        str: The fully rendered SQL query string.
+        Dict[str, str]: Values for the query's $data_file_path, $start_date 
+            and $end_date parameters.
     """
-    # combine base path and relative file path and render the SQL query template
-    extract_query = Template(extract_query_template).render(
-        data_file_path=f"{base_path}/{data_file_path}"
-    )
-    return extract_query
+    # combine base path and relative file path
+    return {
+        "data_file_path": f"{base_path}/{data_file_path}",
+        "start_date": start_date,
+        "end_date": end_date
+    }
+
+
+def execute_extract_query(
+    con: DuckDBPyConnection, query: str, parameters: Dict[str, str]
+) -> None:
+    """
+    Execute an extraction query on its own cursor of the given connection,
+    so several extractions can run concurrently on one connection.
+
+    Args:
+        con (DuckDBPyConnection): The shared database connection object.
+        query (str): The parameterized SQL extraction query.
+        parameters (Dict[str, str]): Values bound to the query's parameters.
+    """
+
+    with con.cursor() as cursor:
+        execute_query(cursor, query, parameters)
 
 
 def extract_data(args):
     """
     1. Reads location IDs from a JSON file.
-    2. Compiles all data file paths for the given date range.
-    3. Reads the SQL query template.
+    2. Compiles a data file path glob for each location.
+    3. Reads the parameterized SQL extraction query.
     4. Connects to the database.
-    5. Executes the rendered query for each data file path.
+    5. Executes the query for each location concurrently, reading
+       only the year/month partitions within the date range.
     6. Closes the database connection.
 
     Args:
@@ -128,43 +128,59 @@ def extract_data(args):
             - extract_query_template_path (str)
             - database_path (str)
             - source_base_path (str)
+            - max_workers (int)
+            - cache_httpfs (bool)
     """
     
     # step 1: get list of location IDs
     location_ids = read_location_ids(args.locations_file_path)
 
-    # step 2: build file path template and compile paths
-    data_file_path_template = "locationid={{location_id}}/year={{year}}/month={{month}}/*"
+    # step 2: build file path template and compile paths; the date range is
+    # applied as a filter on the hive partitions in the query
+    data_file_path_template = "locationid={{location_id}}/year=*/month=*/*"
 
     data_file_paths = compile_data_file_paths(
         data_file_path_template=data_file_path_template,
-        location_ids=location_ids,
-        start_date=args.start_date,
-        end_date=args.end_date
+        location_ids=location_ids
     )
 
-    # step 3: load the SQL extraction template from file
-    extract_query_template = read_query(path=args.extract_query_template_path)
-
-    # step 4: open database connection
-    con = connect_to_database(path=args.database_path)
-
-    # step 5: loop over every file path and run the query
-    for data_file_path in data_file_paths:
-        logging.info(f"Extracting data from {data_file_path}")
-        query = compile_data_file_query(
-            base_path=args.source_base_path,
-            data_file_path=data_file_path,
-            extract_query_template=extract_query_template
-        )
-
-        try:
-            # execute the rendered SQL
-            execute_query(con, query)
-            logging.info(f"Extracted data from {data_file_path}!")
-        except IOException as e:
-            logging.warning(f"Could not find data from {data_file_path}: {e}")
-    
+    # step 3: load the SQL extraction query from file; it is the same for
+    # every location, only its bound parameters change
+    extract_query = read_query(path=args.extract_query_template_path)
+
+    # step 4: open database connection, with one DuckDB thread per
+    # concurrent extraction
+    con = connect_to_database(
+        path=args.database_path, cache_httpfs=args.cache_httpfs, 
+        threads=args.max_workers
+    )
+
+    # step 5: run the query for every location's file path glob; the reads
+    # are bound by remote file latency, so they are issued concurrently
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        futures = {}
+        for data_file_path in data_file_paths:
+            logging.info(f"Extracting data from {data_file_path}")
+            parameters = compile_data_file_query_parameters(
+                base_path=args.source_base_path,
+                data_file_path=data_file_path,
+                start_date=args.start_date,
+                end_date=args.end_date
+            )
+            future = executor.submit(
+                execute_extract_query, con, extract_query, parameters
+            )
+            futures[future] = data_file_path
+
+        for future in as_completed(futures):
+            data_file_path = futures[future]
+            try:
+                # surface any error raised by the SQL
+                future.result()
+                logging.info(f"Extracted data from {data_file_path}!")
+            except IOException as e:
+                logging.warning(f"Could not find data from {data_file_path}: {e}")
+
     # step 6: close the database connection
     close_database_connection(con)
 
@@ -201,6 +217,19 @@ def main():
         required=True,
         help="Base path for the remote data files",
     )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=16,
+        help="Number of data file path globs to extract concurrently",
+    )
+    parser.add_argument(
+        "--cache-httpfs",
+        action="store_true",
+        help="Cache remote files on disk with the cache_httpfs community "
+             "extension so re-runs and backfills skip downloading them "
+             "again (needs network access to install the extension)",
+    )
 
     args = parser.parse_args()
     extract_data(args)
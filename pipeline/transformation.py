@@ -1,16 +1,74 @@
 import argparse
 import logging
+import os
+from itertools import groupby
+from typing import List
+
+from duckdb import DuckDBPyConnection
 
 from database_manager import (
     connect_to_database,
     close_database_connection,
     execute_query,
     collect_query_paths,
-    read_query,
+    compile_query_script,
 )
 
 # Use type hinting to guide
 
+# presentation objects that older databases still hold as views but that
+# the transformation queries now create as tables
+VIEWS_REPLACED_BY_TABLES = [("presentation", "daily_air_quality_stats")]
+
+
+def drop_views_replaced_by_tables(con: DuckDBPyConnection) -> None:
+    """
+    Drop the views that have since been turned into tables, since DuckDB 
+    cannot replace a view with a table.
+
+    Args:
+        con (DuckDBPyConnection): The database connection object.
+    """
+
+    for schema_name, table_name in VIEWS_REPLACED_BY_TABLES:
+        is_view = con.execute(
+            """
+            SELECT count(*) > 0
+            FROM information_schema.tables
+            WHERE table_schema = ?
+            AND table_name = ?
+            AND table_type = 'VIEW'
+            """,
+            [schema_name, table_name]
+        ).fetchone()[0]
+
+        if is_view:
+            execute_query(con, f"DROP VIEW {schema_name}.{table_name}")
+            logging.info(f"Dropped view {schema_name}.{table_name}")
+
+
+def group_query_paths_by_level(query_paths: List[str]) -> List[List[str]]:
+    """
+    Group sorted SQL file paths by the numeric prefix of their file name 
+    (e.g. `0_` in `0_presentation_air_quality_view.sql`), which orders 
+    the files by dependency level.
+
+    Args:
+        query_paths (List[str]): Sorted full paths to SQL files.
+
+    Returns:
+        List[List[str]]: The paths of each dependency level, in order.
+    """
+
+    return [
+        list(level_query_paths)
+        for _, level_query_paths in groupby(
+            query_paths,
+            key=lambda path: os.path.basename(path).split("_", 1)[0]
+        )
+    ]
+
+
 def transform_data(args) -> None:
     """
     Execute a series of SQL transformation queries against a database.
@@ -19,6 +77,8 @@ def transform_data(args) -> None:
         args: Parsed command‑line arguments with attributes:
             - database_path (str): Path to the DuckDB (or other) database file.
             - query_directory (str): Directory containing SQL files to run.
+            - map_cache_path (str): Parquet file to export the latest 
+              values per location to, for the dashboard map.
     """
 
     database_path = args.database_path
@@ -26,13 +86,38 @@ def transform_data(args) -> None:
     # gather all SQL file paths from the specified directory
     query_paths = collect_query_paths(args.query_directory)
 
-    # iterate over each SQL file and execute its contents
-    for query_path in query_paths:
-        query = read_query(query_path)
+    # migrate databases created before these objects became tables
+    drop_views_replaced_by_tables(con)
+
+    # execute the SQL files of each dependency level as one script
+    for level_query_paths in group_query_paths_by_level(query_paths):
+        script = compile_query_script(level_query_paths)
         # execute the SQL against the open connection
-        execute_query(con, query)
+        execute_query(con, script)
+
+        logging.info(f"Executed queries from {', '.join(level_query_paths)}")
 
-        logging.info(f"Executed query from {query_path}")
+    # export the map data so the dashboard can load it without DuckDB;
+    # missing values are replaced with zero for plotting
+    os.makedirs(os.path.dirname(args.map_cache_path) or ".", exist_ok=True)
+    execute_query(
+        con,
+        f"""
+        COPY (
+            SELECT
+                location,
+                lat,
+                lon,
+                datetime,
+                COALESCE(pm10, 0) AS pm10,
+                COALESCE(pm25, 0) AS pm25,
+                COALESCE(so2, 0) AS so2
+            FROM presentation.latest_param_values_per_location
+        )
+        TO '{args.map_cache_path}' (FORMAT PARQUET)
+        """
+    )
+    logging.info(f"Exported map data to {args.map_cache_path}")
 
     close_database_connection(con)
 
@@ -54,6 +139,12 @@ def main():
         required=True,
         help="Directory containing SQL transformation queries",
     )
+    parser.add_argument(
+        "--map-cache-path",
+        type=str,
+        default="../cache/map.parquet",
+        help="Parquet file the dashboard map data is exported to",
+    )
 
     args = parser.parse_args()
     transform_data(args)
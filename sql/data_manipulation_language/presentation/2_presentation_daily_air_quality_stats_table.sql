@@ -1,4 +1,4 @@
-CREATE OR REPLACE VIEW presentation.daily_air_quality_stats AS
+CREATE OR REPLACE TABLE presentation.daily_air_quality_stats AS
 WITH air_quality_cte AS (
     SELECT
         location_id,
@@ -41,4 +41,8 @@ GROUP BY
     lat,
     lon,
     parameter,
-    units;
\ No newline at end of file
+    units
+ORDER BY
+    location,
+    parameter,
+    measurement_date;
\ No newline at end of file
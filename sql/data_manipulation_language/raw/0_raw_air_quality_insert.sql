@@ -13,4 +13,6 @@ SELECT
     "month", 
     "year",
     current_timestamp AS ingestion_datetime
-FROM read_csv('{{ data_file_path }}');
\ No newline at end of file
+FROM read_csv($data_file_path, hive_partitioning = true)
+WHERE make_date(CAST("year" AS INTEGER), CAST("month" AS INTEGER), 1)
+    BETWEEN strptime($start_date, '%Y-%m') AND strptime($end_date, '%Y-%m');
\ No newline at end of file